@@ -41,10 +41,11 @@ EXAMPLES = '''
 '''
 
 import os
-import re
+import string
+import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.six import iteritems, string_types
+from ansible.module_utils.six import string_types
 
 # exceptions -------------------------------------------------------------- {{{
 class MasException(Exception):
@@ -52,33 +53,34 @@ class MasException(Exception):
 # /exceptions ------------------------------------------------------------- }}}
 
 # utils ------------------------------------------------------------------- {{{
-def _create_regex_group(s):
-    lines = (line.strip() for line in s.split('\n') if line.strip())
-    chars = filter(None, (line.split('#')[0].strip() for line in lines))
-    group = r'[^' + r''.join(chars) + r']'
-    return re.compile(group)
+def _parse_appids(out):
+    '''Collect the leading appid of each line of `mas list`/`mas outdated`.'''
+    fields = (line.split(None, 1) for line in out.splitlines())
+    return set(field[0] for field in fields if field and field[0].isdigit())
 # /utils ------------------------------------------------------------------ }}}
 
+# caches ------------------------------------------------------------------ {{{
+# executable paths resolved by get_bin_path(), kept across Mas instances
+_BIN_PATH_CACHE = {}
+
+# environment for mas commands, so their output can be parsed reliably
+C_LOCALE_ENV = dict(LANG='C', LC_ALL='C', LC_MESSAGES='C', LC_CTYPE='C')
+_QUERY_ENV = dict(os.environ, **C_LOCALE_ENV)
+# /caches ----------------------------------------------------------------- }}}
+
+# charsets ---------------------------------------------------------------- {{{
+VALID_MAS_PATH_CHARS = frozenset(
+    string.ascii_letters + string.digits + '_'  # alphanumeric characters
+    + ' '                                       # spaces
+    + os.path.sep                               # the OS-specific path separator
+    + '.'                                       # dots
+    + '-'                                       # dashes
+)
+# /charsets --------------------------------------------------------------- }}}
+
 class Mas(object):
     ''' A class to manage Mac App Store applications.'''
 
-    # class regexes ------------------------------------------------ {{{
-    VALID_MAS_PATH_CHARS = r'''
-        \w                  # alphanumeric characters (i.e., [a-zA-Z0-9_])
-        \s                  # spaces
-        {sep}               # the OS-specific path separator
-        .                   # dots
-        -                   # dashes
-    '''.format(sep=os.path.sep)
-
-    VALID_PACKAGE_CHARS = r'''
-        \d                  # numeric characters (i.e., [0-9])
-    '''
-
-    INVALID_MAS_PATH_REGEX = _create_regex_group(VALID_MAS_PATH_CHARS)
-    INVALID_PACKAGE_REGEX  = _create_regex_group(VALID_PACKAGE_CHARS)
-    # /class regexes ----------------------------------------------- }}}
-
     # class validations -------------------------------------------- {{{
 
     @classmethod
@@ -99,19 +101,16 @@ class Mas(object):
 
         return (
             isinstance(mas_path, string_types)
-            and not cls.INVALID_MAS_PATH_REGEX.search(mas_path)
+            and VALID_MAS_PATH_CHARS.issuperset(mas_path)
         )
 
     @classmethod
     def valid_package(cls, package):
         '''A valid package is either None or numeric.'''
 
-        if package is None:
-            return True
-
-        return (
+        return package is None or (
             isinstance(package, string_types)
-            and not cls.INVALID_PACKAGE_REGEX.search(package)
+            and package.isdigit()
         )
 
     @classmethod
@@ -122,62 +121,13 @@ class Mas(object):
 
     # /class validations ------------------------------------------- }}}
 
-    # class properties --------------------------------------------- {{{
-    @property
-    def module(self):
-        return self._module
-
-    @module.setter
-    def module(self, module):
-        if not self.valid_module(module):
-            self._module = None
-            self.failed = True
-            self.message = 'Invalid module: {0}.'.format(module)
-            raise MasException(self.message)
-
-        else:
-            self._module = module
-            return module
-
-    @property
-    def mas_path(self):
-        return self._mas_path
-
-    @mas_path.setter
-    def mas_path(self, mas_path):
-        if not self.valid_mas_path(mas_path):
-            self._mas_path = None
-            self.failed = True
-            self.message = 'Invalid mas_path: {0}.'.format(mas_path)
-            raise MasException(self.message)
-
-        else:
-            self._mas_path = mas_path
-            return mas_path
-
-    @property
-    def current_package(self):
-        return self._current_package
-
-    @current_package.setter
-    def current_package(self, package):
-        if not self.valid_package(package):
-            self._current_package = None
-            self.failed = True
-            self.message = 'Invalid package: {0}.'.format(package)
-            raise MasException(self.message)
-
-        else:
-            self._current_package = package
-            return package
-    # /class properties -------------------------------------------- }}}
-
     def __init__(self, module, packages=None, state=None):
         self._setup_status_vars()
-        self._setup_instance_vars(
-                module=module,
-                packages=packages,
-                state=state, )
+        self.module = module
+        self.packages = packages
+        self.state = state
+        self.mas_path = None
+        self.current_package = None
         self._prep()
 
     # prep --------------------------------------------------------- {{{
@@ -188,41 +138,95 @@ class Mas(object):
         self.unchanged_count = 0
         self.message = ''
 
-    def _setup_instance_vars(self, **kwargs):
-        for key, val in iteritems(kwargs):
-            setattr(self, key, val)
-
     def _prep(self):
-        self._prep_mas_path()
-
-    def _prep_mas_path(self):
+        if (
+            self._prep_module()
+            and self._prep_packages()
+            and self._prep_mas_path()
+        ):
+            self._prep_status()
+
+    def _prep_module(self):
         if not self.module:
-            self.mas_path = None
             self.failed = True
             self.message = 'AnsibleModule not set.'
-            raise MasException(self.message)
+            return False
 
-        self.mas_path = self.module.get_bin_path(
-                'mas',
-                required=True,
-                )
-        if not self.mas_path:
-            self.mas_path = None
+        if not self.valid_module(self.module):
+            self.failed = True
+            self.message = 'Invalid module: {0}.'.format(self.module)
+            return False
+
+        return True
+
+    def _prep_packages(self):
+        packages = []
+        invalid = []
+        seen = set()
+        for package in self.packages or []:
+            if not package or package in seen:
+                continue
+            seen.add(package)
+            if self.valid_package(package):
+                packages.append(package)
+            else:
+                invalid.append(package)
+
+        self.packages = packages
+        if invalid:
+            self.failed = True
+            self.message = 'Invalid package: {0}.'.format(
+                ', '.join(str(package) for package in invalid)
+            )
+            return False
+
+        return True
+
+    def _prep_mas_path(self):
+        mas_path = _BIN_PATH_CACHE.get('mas')
+        if not mas_path or not os.path.isfile(mas_path):
+            mas_path = self.module.get_bin_path(
+                    'mas',
+                    required=True,
+                    )
+            _BIN_PATH_CACHE['mas'] = mas_path
+
+        if not mas_path:
             self.failed = True
             self.message = 'Unable to locate mas executable.'
-            raise MasException(self.message)
+            return None
 
+        if not self.valid_mas_path(mas_path):
+            self.failed = True
+            self.message = 'Invalid mas_path: {0}.'.format(mas_path)
+            return None
+
+        self.mas_path = mas_path
         return self.mas_path
 
+    def _prep_status(self):
+        self._installed_ids = _parse_appids(self._query('list'))
+        self._outdated_ids = _parse_appids(self._query('outdated'))
+
+    def _query(self, command):
+        '''Run a read-only mas command and return its output.'''
+        proc = subprocess.Popen(
+            [self.mas_path, command],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=_QUERY_ENV,
+            universal_newlines=True,
+        )
+        out, err = proc.communicate()
+        return out
+
     def _status(self):
         return (self.failed, self.changed, self.message)
     # /prep -------------------------------------------------------- }}}
 
     def run(self):
-        try:
+        if not self.failed:
             self._run()
-        except MasException:
-            pass
 
         if not self.failed and (self.changed_count + self.unchanged_count > 1):
             self.message = "Changed: %d, Unchanged: %d" % (
@@ -235,134 +239,120 @@ class Mas(object):
 
     # checks ------------------------------------------------------- {{{
     def _current_package_is_installed(self):
-        if not self.valid_package(self.current_package):
-            self.failed = True
-            self.message = 'Invalid package: {0}.'.format(self.current_package)
-            raise MasException(self.message)
-
-        cmd = [
-            "{mas_path}".format(mas_path=self.mas_path),
-            "list",
-        ]
-        rc, out, err = self.module.run_command(cmd)
-        for line in out.split('\n'):
-            if line.find(self.current_package) != -1:
-                return True
-
-        return False
+        return self.current_package in self._installed_ids
 
     def _current_package_is_outdated(self):
-        if not self.valid_package(self.current_package):
-            return False
-
-        rc, out, err = self.module.run_command([
-            self.mas_path,
-            'outdated',
-        ])
-        for line in out.split('\n'):
-            if line.find(self.current_package) != -1:
-                return True
-
-        return False
+        return self.current_package in self._outdated_ids
 
     # /checks ------------------------------------------------------ }}}
 
     # commands ----------------------------------------------------- {{{
     def _run(self):
-        if self.packages:
-            if self.state == 'present':
-                return self._install_packages()
-            elif self.state == 'latest':
-                return self._upgrade_packages()
+        if self.state == 'present':
+            return self._install_packages()
+        elif self.state == 'latest':
+            return self._upgrade_packages()
+
+    def _install(self, packages):
+        rc, out, err = self.module.run_command(
+            [self.mas_path, 'install'] + packages
+        )
+        if rc == 0:
+            self._installed_ids.update(packages)
+            self._outdated_ids.difference_update(packages)
+        else:
+            # some of the packages may still have been installed
+            self._prep_status()
+
+        return err
 
     # installed ------------------------------ {{{
-    def _install_current_package(self):
-        if not self.valid_package(self.current_package):
-            self.failed = True
-            self.message = 'Invalid package: {0}.'.format(self.current_package)
-            raise MasException(self.message)
+    def _install_packages(self):
+        to_install = []
+        for package in self.packages:
+            self.current_package = package
+            if self._current_package_is_installed():
+                self.unchanged_count += 1
+                self.message = 'Package already installed: {0}'.format(
+                    self.current_package,
+                )
+            else:
+                to_install.append(package)
 
-        if self._current_package_is_installed():
-            self.unchanged_count += 1
-            self.message = 'Package already installed: {0}'.format(
-                self.current_package,
-            )
+        if not to_install:
             return True
 
         if self.module.check_mode:
             self.changed = True
             self.message = 'Package would be installed: {0}'.format(
-                self.current_package
+                ', '.join(to_install)
             )
-            raise MasException(self.message)
+            return True
 
-        opts = (
-            [self.mas_path, 'install']
-            + [self.current_package]
-        )
-        cmd = [opt for opt in opts if opt]
-        rc, out, err = self.module.run_command(cmd)
+        err = self._install(to_install)
 
-        if self._current_package_is_installed():
-            self.changed_count += 1
-            self.changed = True
-            self.message = 'Package installed: {0}'.format(self.current_package)
-            return True
-        else:
+        installed = []
+        for package in to_install:
+            self.current_package = package
+            if self._current_package_is_installed():
+                installed.append(package)
+
+        self.changed_count += len(installed)
+        self.changed = bool(installed)
+        if len(installed) < len(to_install):
             self.failed = True
             self.message = err.strip()
-            raise MasException(self.message)
-
-    def _install_packages(self):
-        for package in self.packages:
-            self.current_package = package
-            self._install_current_package()
+            return False
 
+        self.message = 'Package installed: {0}'.format(', '.join(installed))
         return True
     # /installed ----------------------------- }}}
 
     # upgraded ------------------------------- {{{
-    def _upgrade_current_package(self):
-        if not self.valid_package(self.current_package):
-            self.failed = True
-            self.message = 'Invalid package: {0}.'.format(self.current_package)
-            raise MasException(self.message)
+    def _current_package_is_upgraded(self):
+        return (
+            self._current_package_is_installed()
+            and not self._current_package_is_outdated()
+        )
 
-        if self._current_package_is_installed() and not self._current_package_is_outdated():
-            self.message = 'Package is already upgraded: {0}'.format(
-                self.current_package,
-            )
-            self.unchanged_count += 1
+    def _upgrade_packages(self):
+        to_upgrade = []
+        for package in self.packages:
+            self.current_package = package
+            if self._current_package_is_upgraded():
+                self.unchanged_count += 1
+                self.message = 'Package is already upgraded: {0}'.format(
+                    self.current_package,
+                )
+            else:
+                to_upgrade.append(package)
+
+        if not to_upgrade:
             return True
 
         if self.module.check_mode:
             self.changed = True
             self.message = 'Package would be upgraded: {0}'.format(
-                self.current_package
+                ', '.join(to_upgrade)
             )
-            raise MasException(self.message)
+            return True
 
-        opts = (
-            [self.mas_path, 'install']
-            + [self.current_package]
-        )
-        cmd = [opt for opt in opts if opt]
-        rc, out, err = self.module.run_command(cmd)
+        err = self._install(to_upgrade)
 
-        if self._current_package_is_installed() and not self._current_package_is_outdated():
-            self.changed_count += 1
-            self.changed = True
-            self.message = 'Package upgraded: {0}'.format(self.current_package)
-            return True
-        else:
+        upgraded = []
+        for package in to_upgrade:
+            self.current_package = package
+            if self._current_package_is_upgraded():
+                upgraded.append(package)
+
+        self.changed_count += len(upgraded)
+        self.changed = bool(upgraded)
+        if len(upgraded) < len(to_upgrade):
             self.failed = True
             self.message = err.strip()
-            raise MasException(self.message)
+            return False
 
-    def _upgrade_packages(self):
-        for package in self.packages:
-            self.current_package = package
-            self._upgrade_current_package()
+        self.message = 'Package upgraded: {0}'.format(', '.join(upgraded))
         return True
     # /upgraded ------------------------------ }}}
     # /commands ---------------------------------------------------- }}}
@@ -389,7 +379,7 @@ def main():
         supports_check_mode=True,
     )
 
-    module.run_command_environ_update = dict(LANG='C', LC_ALL='C', LC_MESSAGES='C', LC_CTYPE='C')
+    module.run_command_environ_update = C_LOCALE_ENV
 
     p = module.params
 